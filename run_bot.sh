@@ -27,7 +27,9 @@ export PLAYWRIGHT_BROWSERS_PATH="${PLAYWRIGHT_BROWSERS_PATH:-$PWD/.pw-browsers}"
 echo "[setup] Ensuring Playwright Chromium at $PLAYWRIGHT_BROWSERS_PATH ..."
 python -m playwright install chromium || true
 
-# Prevent overlapping runs using flock
+# Prevent overlapping runs on this host using flock. To spread work over
+# several hosts, set QUEUE_DB to a SQLite file on shared storage: URLs are
+# then claimed from that queue with leases, so hosts never duplicate a URL.
 LOCKFILE="/tmp/sitemap-tweetbot.lock"
 (
   flock -n 9 || { echo "Another run is in progress; exiting"; exit 0; }
@@ -42,7 +44,8 @@ LOCKFILE="/tmp/sitemap-tweetbot.lock"
     --block-ads \
     --use-openai \
     --hashtag-strategy popular \
-    --post-to-x
+    --post-to-x \
+    ${QUEUE_DB:+--queue "$QUEUE_DB"}
 ) 9>"$LOCKFILE"
 
 echo "[done]"
@@ -0,0 +1,148 @@
+import json
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DATA_PATH = Path(__file__).with_name('hashtags.json')
+
+TITLE_WEIGHT = 2.0
+KEYWORD_WEIGHT = 1.0
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+class HashtagIndex:
+    """Keyword -> bucket/hashtag lookup built once from hashtags.json.
+
+    A page is classified in one tokenization pass: each token (and each
+    adjacent token pair, for phrases like 'merge pdf') is a dict lookup,
+    so keywords only match whole words ('ci' no longer hits 'circuit').
+    """
+
+    def __init__(self, data: Dict):
+        self.fallback: str = data.get('fallback', 'general')
+        self.buckets: Dict[str, List[str]] = {}
+        self.order: Dict[str, int] = {}
+        self.keywords: Dict[str, Tuple[str, ...]] = {}
+        for i, (name, spec) in enumerate(data.get('buckets', {}).items()):
+            self.buckets[name] = list(spec.get('tags', []))
+            self.order[name] = i
+            targets = [name] + list(spec.get('implies', []))
+            for kw in spec.get('keywords', []):
+                key = ' '.join(_tokens(kw))
+                if not key:
+                    continue
+                current = self.keywords.get(key, ())
+                self.keywords[key] = current + tuple(t for t in targets if t not in current)
+        self.common: Dict[str, str] = dict(data.get('common', {}))
+
+    @classmethod
+    def load(cls, path: Path = DATA_PATH) -> 'HashtagIndex':
+        return cls(json.loads(Path(path).read_text()))
+
+    def _lookup(self, token: str) -> Tuple[str, ...]:
+        hit = self.keywords.get(token)
+        if hit is None and len(token) > 3 and token.endswith('s'):
+            # cheap plural folding: 'tools' -> 'tool', 'circuits' -> 'circuit'
+            hit = self.keywords.get(token[:-1])
+        return hit or ()
+
+    def _score_into(self, scores: Dict[str, float], text: str, weight: float) -> None:
+        prev = ''
+        for tok in _tokens(text):
+            for b in self._lookup(tok):
+                scores[b] = scores.get(b, 0.0) + weight
+            if prev:
+                for b in self.keywords.get(f"{prev} {tok}", ()):
+                    scores[b] = scores.get(b, 0.0) + weight
+            prev = tok
+
+    def classify(self, title: str, keywords: str) -> List[Tuple[str, float]]:
+        """Return (bucket, score) pairs, best first; ties keep data-file order."""
+        scores: Dict[str, float] = {}
+        self._score_into(scores, title, TITLE_WEIGHT)
+        self._score_into(scores, keywords, KEYWORD_WEIGHT)
+        if not scores:
+            return [(self.fallback, 0.0)]
+        return sorted(scores.items(), key=lambda kv: (-kv[1], self.order.get(kv[0], len(self.order))))
+
+    def choose_buckets(self, title: str, keywords: str) -> List[str]:
+        return [b for b, _ in self.classify(title, keywords)]
+
+    def rank_hashtags(self, title: str, keywords: str, limit: int = 6) -> List[Tuple[str, float]]:
+        """Score candidate hashtags for a page.
+
+        A curated tag inherits the score of every bucket that lists it, so
+        tags shared by several matching buckets (e.g. #STEM) rank higher.
+        Direct token hits in the common map add their field weight.
+        """
+        scores: Dict[str, float] = {}
+        first_seen: Dict[str, int] = {}
+        display: Dict[str, str] = {}
+
+        def add(tag: str, score: float) -> None:
+            key = tag.lower()
+            if key not in first_seen:
+                first_seen[key] = len(first_seen)
+                display[key] = tag
+            scores[key] = scores.get(key, 0.0) + score
+
+        for bucket, score in self.classify(title, keywords):
+            for tag in self.buckets.get(bucket, []):
+                add(tag, score)
+        for text, weight in ((title, TITLE_WEIGHT), (keywords, KEYWORD_WEIGHT)):
+            for tok in _tokens(text):
+                tag = self.common.get(tok)
+                if tag:
+                    add(tag, weight)
+
+        ranked = sorted(scores, key=lambda k: (-scores[k], first_seen[k]))
+        return [(display[k], scores[k]) for k in ranked[:limit]]
+
+    def popular_tags(self, buckets: Iterable[str], limit: int = 6) -> List[str]:
+        tags: List[str] = []
+        seen = set()
+        for b in buckets:
+            for h in self.buckets.get(b, []):
+                if h.lower() not in seen:
+                    seen.add(h.lower())
+                    tags.append(h)
+                if len(tags) >= limit:
+                    return tags
+        return tags
+
+    def rank_hashtags_many(self, metas: Iterable[Dict[str, str]], limit: int = 6) -> List[List[Tuple[str, float]]]:
+        """rank_hashtags over many meta records (as produced by extract_meta_from_page).
+
+        Identical title/keyword pairs, common across templated pages, are
+        ranked once.
+        """
+        cache: Dict[Tuple[str, str], List[Tuple[str, float]]] = {}
+        out = []
+        for meta in metas:
+            key = meta_text(meta)
+            if key not in cache:
+                cache[key] = self.rank_hashtags(*key, limit=limit)
+            out.append(cache[key])
+        return out
+
+
+def meta_text(meta: Dict[str, str]) -> Tuple[str, str]:
+    title = meta.get('og:title') or meta.get('title') or ''
+    keywords = meta.get('keywords') or ''
+    return title, keywords
+
+
+_DEFAULT_INDEX: Optional[HashtagIndex] = None
+
+
+def get_index() -> HashtagIndex:
+    """Shared index loaded from the bundled data file on first use."""
+    global _DEFAULT_INDEX
+    if _DEFAULT_INDEX is None:
+        _DEFAULT_INDEX = HashtagIndex.load()
+    return _DEFAULT_INDEX
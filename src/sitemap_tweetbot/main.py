@@ -1,88 +1,50 @@
 import argparse
-import time
 import random
 import sys
-import csv
-import json
 from pathlib import Path
-import xml.etree.ElementTree as ET
-
-from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright
-
-from .tweetgen import compose_tweet
-from .screenshot import take_screenshot, DEFAULT_VIEWPORT, AD_HOST_PATTERNS
-from .openai_gen import generate_tweet_openai, DEFAULT_MODEL as OPENAI_DEFAULT_MODEL
-from .x_poster import (
-    post_tweet_with_media_v2,
-    post_tweet_with_media_v1,
-    post_text_v2,
-    post_text_v1,
-    XAuthError,
+
+# Only light modules at import time: Playwright/BeautifulSoup, the OpenAI SDK
+# and tweepy are imported by the stage that uses them (see stages.py).
+from .screenshot import DEFAULT_VIEWPORT, extract_meta_from_page  # noqa: F401 (re-export)
+from .openai_gen import DEFAULT_MODEL as OPENAI_DEFAULT_MODEL
+from .sitemap_index import read_sitemap_entries, open_index, RunState, record_run
+from .work_queue import open_queue, default_worker_id, DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS
+from .stages import (
+    read_records,
+    write_records,
+    process_records,
+    captured,
+    posted,
+    capture_record,
+    generate_record,
+    post_record,
+    write_outputs,
 )
 
 
 def read_sitemap(path: Path):
-    tree = ET.parse(str(path))
-    root = tree.getroot()
-    # namespaces optional; handle default
-    urls = []
-    for loc in root.iter():
-        if loc.tag.endswith('loc') and loc.text:
-            urls.append(loc.text.strip())
-    return urls
-
-
-def extract_meta_from_page(url: str, timeout_ms: int = 30000, wait_until: str = 'domcontentloaded', block_ads: bool = True):
-    meta = {}
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(viewport={'width': DEFAULT_VIEWPORT[0], 'height': DEFAULT_VIEWPORT[1]})
-        page = context.new_page()
-        if block_ads:
-            def _route(route):
-                u = route.request.url
-                if any(pat in u for pat in AD_HOST_PATTERNS):
-                    return route.abort()
-                return route.continue_()
-            context.route("**/*", _route)
-        # more tolerant load sequence
-        try:
-            page.goto(url, wait_until=wait_until, timeout=timeout_ms)
-        except Exception:
-            try:
-                page.goto(url, wait_until='load', timeout=int(timeout_ms*1.5))
-            except Exception:
-                page.goto(url, wait_until='domcontentloaded', timeout=int(timeout_ms*2))
-        html = page.content()
-        context.close()
-        browser.close()
-    soup = BeautifulSoup(html, 'lxml')
-    def get(name, attr='name'):
-        tag = soup.find('meta', {attr: name})
-        return (tag.get('content') or '').strip() if tag and tag.has_attr('content') else ''
-    # collect several common fields
-    meta['title'] = (soup.title.string.strip() if soup.title and soup.title.string else '')
-    meta['og:title'] = get('og:title', 'property')
-    meta['description'] = get('description')
-    meta['og:description'] = get('og:description', 'property')
-    meta['keywords'] = get('keywords')
-    return meta
-
-
-def main():
-    ap = argparse.ArgumentParser(description='Generate tweet copy + screenshots from a sitemap.xml')
+    return [url for url, _ in read_sitemap_entries(path)]
+
+
+def _add_select_args(ap, count_default, count_help='Number of URLs to pick'):
     ap.add_argument('--sitemap', type=Path, default=Path('sitemap.xml'))
-    ap.add_argument('--count', type=int, default=2)
+    ap.add_argument('--count', type=int, default=count_default, help=count_help)
     ap.add_argument('--out', type=Path, default=Path('outputs'))
     ap.add_argument('--exclude-patterns', type=str, default='/docs/', help='Comma-separated substrings; URLs containing any will be skipped (case-insensitive)')
+    ap.add_argument('--index', type=Path, default=None, help='Persisted sitemap index (default: <out>/sitemap.idx); rebuilt only when the sitemap or exclude patterns change')
+    ap.add_argument('--only-changed', action='store_true', help='Pick only URLs added or modified (lastmod) since the last run, freshest first')
+
+
+def _add_capture_args(ap):
     ap.add_argument('--width', type=int, default=DEFAULT_VIEWPORT[0])
     ap.add_argument('--height', type=int, default=DEFAULT_VIEWPORT[1])
     ap.add_argument('--timeout', type=int, default=30000)
     ap.add_argument('--wait-until', type=str, default='domcontentloaded', choices=['domcontentloaded','load','networkidle'], help='Playwright wait target for navigation')
     ap.add_argument('--block-ads', dest='block_ads', action='store_true', default=True, help='Block requests to common ad hosts and hide ad containers')
     ap.add_argument('--no-block-ads', dest='block_ads', action='store_false')
-    # OpenAI options
+
+
+def _add_generate_args(ap):
     ap.add_argument('--use-openai', action='store_true', help='Use OpenAI to generate tweet copy')
     ap.add_argument('--openai-model', type=str, default=OPENAI_DEFAULT_MODEL)
     ap.add_argument('--tone', type=str, default='helpful, confident, concise')
@@ -90,143 +52,285 @@ def main():
     ap.add_argument('--hashtags', type=str, default='', help='Comma-separated list of preferred hashtags')
     ap.add_argument('--hashtag-strategy', type=str, default='auto', choices=['auto','popular','input'], help='OpenAI hashtag strategy: popular=relevant high-reach only; input=use --hashtags only; auto=mix popular + derived')
     ap.add_argument('--cta', type=str, default='Try it')
-    # X/Twitter posting
-    ap.add_argument('--post-to-x', action='store_true', help='Post tweets to X via API (requires env and TWITTER_POST=1)')
+    ap.add_argument('--variants', type=int, default=1, help='Local generator: emit up to N tweet variants per URL for A/B testing (first is used for posting)')
+
+
+def _add_post_args(ap):
     ap.add_argument('--x-wait-seconds', type=int, default=2, help='Delay between posts to avoid rate limits')
     ap.add_argument('--x-no-alt', dest='x_use_alt', action='store_false', default=True, help='Do not attach alt text to media')
-    args = ap.parse_args()
 
+
+def _add_io_args(ap, with_input=True):
+    if with_input:
+        ap.add_argument('-i', '--input', type=str, default='-', help="Input records (JSONL); '-' for stdin")
+    ap.add_argument('-o', '--output', type=str, default='-', help="Output records (JSONL); '-' for stdout")
+
+
+def _open_index(args):
     if not args.sitemap.exists():
         print(f"Sitemap not found: {args.sitemap}", file=sys.stderr)
         sys.exit(1)
 
-    urls = read_sitemap(args.sitemap)
-    if not urls:
+    index = open_index(args.sitemap, args.index or (args.out / 'sitemap.idx'), args.exclude_patterns)
+    if not len(index):
         print('No URLs found in sitemap', file=sys.stderr)
         sys.exit(2)
 
-    # filter excluded patterns
-    patterns = [p.strip().lower() for p in (args.exclude_patterns or '').split(',') if p.strip()]
-    if patterns:
-        urls = [u for u in urls if all(p not in u.lower() for p in patterns)]
-
-    if not urls:
+    # exclude patterns are applied when the index is built
+    positions = index.selectable()
+    if not positions:
         print('No URLs remain after applying exclude patterns', file=sys.stderr)
         sys.exit(3)
+    return index, positions
+
+
+def _changed(args, index):
+    """For --only-changed: (state, fresh positions); fresh is None until a
+    baseline exists and [] when nothing changed."""
+    if not args.only_changed:
+        return None, None
+    state = RunState(args.out / 'sitemap.state')
+    if not state.exists():
+        print('No previous run state; recording a baseline and picking at random', file=sys.stderr)
+        return state, None
+    fresh = index.changed(state)
+    if not fresh:
+        print('No new or modified URLs since the last run', file=sys.stderr)
+    return state, fresh
+
+
+def _pick(positions, fresh, count):
+    """Positions to process; count <= 0 means all (select stage only)."""
+    if fresh is not None:
+        return fresh if count <= 0 else fresh[:count]
+    if count <= 0:
+        return list(positions)
+    return random.sample(positions, k=min(count, len(positions)))
+
+
+def _record_run(index, state, fresh, picked):
+    if state is not None:
+        done = set(picked)
+        record_run(index, state, pending=[i for i in (fresh or []) if i not in done])
+
+
+def _generate_kwargs(args):
+    tags = [t.strip() for t in (args.hashtags or '').split(',') if t.strip()]
+    return dict(
+        use_openai=args.use_openai,
+        openai_model=args.openai_model,
+        tone=args.tone,
+        brand=(args.brand or None),
+        hashtags=(tags or None),
+        cta=args.cta,
+        hashtag_strategy=args.hashtag_strategy,
+        variants=args.variants,
+    )
+
+
+def cmd_select(args):
+    index, positions = _open_index(args)
+    state, fresh = _changed(args, index)
+    picked = _pick(positions, fresh, args.count)
+    # handing URLs to the next stage counts as processing them. When nothing
+    # changed the output is still rewritten (empty), so later stages do not
+    # run the previous batch again
+    _record_run(index, state, fresh, picked)
+    n = write_records(({'url': u} for u in index.urls(picked)), args.output)
+    print(f"Selected {n} URLs", file=sys.stderr)
+
+
+def cmd_capture(args):
+    def capture(record):
+        if args.skip_done and captured(record):
+            return record
+        print(f"Capturing: {record['url']}", file=sys.stderr)
+        capture_record(
+            record,
+            args.out,
+            viewport=(args.width, args.height),
+            timeout_ms=args.timeout,
+            wait_until=args.wait_until,
+            block_ads=args.block_ads,
+        )
+        return record
+    process_records(args.input, args.output, capture, done=captured if args.skip_done else None)
+
 
-    pick = random.sample(urls, k=min(args.count, len(urls)))
+def cmd_generate(args):
+    kwargs = _generate_kwargs(args)
+
+    def generate(record):
+        generate_record(record, **kwargs)
+        return record
+    process_records(args.input, args.output, generate)
+
+
+def cmd_post(args):
+    def post(record):
+        if posted(record):
+            # already posted; never post twice when a stage is re-run
+            return record
+        if not record.get('tweet'):
+            print(f"  No tweet for {record.get('url')}; run generate first", file=sys.stderr)
+            return record
+        print(f"Posting: {record['url']}", file=sys.stderr)
+        post_record(record, use_alt=args.x_use_alt, wait_seconds=args.x_wait_seconds, dry_run=args.dry_run)
+        return record
+    # always resume: URLs already posted by an earlier run are skipped
+    process_records(args.input, args.output, post, done=posted)
+
+
+def cmd_report(args):
+    write_outputs(list(read_records(args.input)), args.out)
+    print(f"Done. Wrote: {args.out/'posts.json'}, {args.out/'posts.csv'}, {args.out/'posts.md'}", file=sys.stderr)
+
+
+STAGES = {
+    'select': cmd_select,
+    'capture': cmd_capture,
+    'generate': cmd_generate,
+    'post': cmd_post,
+    'report': cmd_report,
+}
+
+
+def stage_main(argv):
+    ap = argparse.ArgumentParser(
+        prog='sitemap_tweetbot.main',
+        description='Run one pipeline stage; stages exchange JSONL records (see stages.py)',
+    )
+    sub = ap.add_subparsers(dest='stage', required=True)
+
+    p = sub.add_parser('select', help='Pick URLs from the sitemap')
+    _add_select_args(p, count_default=0, count_help='Number of URLs to pick (0 = all)')
+    _add_io_args(p, with_input=False)
+
+    p = sub.add_parser('capture', help='Screenshot pages and extract their meta tags (Playwright)')
+    p.add_argument('--out', type=Path, default=Path('outputs'), help='Screenshot directory')
+    p.add_argument('--skip-done', action='store_true', help='Pass through records already captured; when writing to another file, skip URLs captured in it and retry the rest (resume an interrupted run)')
+    _add_capture_args(p)
+    _add_io_args(p)
+
+    p = sub.add_parser('generate', help='Write tweet copy (local generator or OpenAI)')
+    _add_generate_args(p)
+    _add_io_args(p)
+
+    p = sub.add_parser('post', help='Post tweets to X (requires env and TWITTER_POST=1)')
+    _add_post_args(p)
+    p.add_argument('--dry-run', action='store_true', help='Go through the motions without posting')
+    _add_io_args(p)
+
+    p = sub.add_parser('report', help='Write posts.json/csv/md from records')
+    p.add_argument('--out', type=Path, default=Path('outputs'))
+    p.add_argument('-i', '--input', type=str, default='-', help="Input records (JSONL); '-' for stdin")
+
+    args = ap.parse_args(argv)
+    STAGES[args.stage](args)
+
+
+def run_all(argv):
+    ap = argparse.ArgumentParser(description='Generate tweet copy + screenshots from a sitemap.xml')
+    _add_select_args(ap, count_default=2)
+    # Shared work queue (multi-node)
+    ap.add_argument('--queue', type=str, default='', help='Claim URLs from a shared work queue: path to a SQLite file every worker can reach')
+    ap.add_argument('--worker-id', type=str, default='', help='Queue worker name (default: hostname:pid)')
+    ap.add_argument('--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS, help='How long a claimed URL stays reserved before other workers may reclaim it')
+    ap.add_argument('--queue-max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS, help='Claims per URL before it is parked as failed')
+    _add_capture_args(ap)
+    # OpenAI options
+    _add_generate_args(ap)
+    # X/Twitter posting
+    ap.add_argument('--post-to-x', action='store_true', help='Post tweets to X via API (requires env and TWITTER_POST=1)')
+    _add_post_args(ap)
+    args = ap.parse_args(argv)
+    if args.count <= 0:
+        ap.error('--count must be positive')
+
+    index, positions = _open_index(args)
+    state, fresh = _changed(args, index)
+
+    queue = None
+    worker = args.worker_id or default_worker_id()
+    if args.queue:
+        # every node enqueues the same candidates (idempotent), then claims its
+        # share. With --only-changed, modified URLs that were already done go
+        # back to pending; claim even when nothing changed, so the backlog drains
+        queue = open_queue(args.queue, max_attempts=args.queue_max_attempts)
+        if fresh is None:
+            added = queue.enqueue(index.urls(positions))
+        else:
+            added = queue.enqueue(index.urls(fresh), requeue=True)
+        pick = queue.claim(worker, args.count, lease_seconds=args.lease_seconds)
+        print(f"Queue {args.queue}: {added} queued, claimed {len(pick)} as {worker}; {queue.stats()}")
+        # queued URLs are tracked by the queue, not the run state
+        picked = fresh or []
+        if not pick:
+            print('No claimable URLs left in the queue')
+            _record_run(index, state, fresh, picked)
+            queue.close()
+            return
+    elif fresh == []:
+        return
+    else:
+        picked = _pick(positions, fresh, args.count)
+        pick = index.urls(picked)
 
     args.out.mkdir(parents=True, exist_ok=True)
+    generate_kwargs = _generate_kwargs(args)
     results = []
 
     for url in pick:
+        if queue is not None and not queue.renew(url, worker, lease_seconds=args.lease_seconds):
+            print(f"Lease lost, skipping: {url}", file=sys.stderr)
+            continue
         print(f"Processing: {url}")
-        shot_path = ''
-        try:
-            shot = take_screenshot(
-                url,
-                args.out,
-                viewport=(args.width, args.height),
-                timeout_ms=args.timeout,
-                wait_until=args.wait_until,
-                block_ads=args.block_ads,
-            )
-            shot_path = str(shot)
-        except Exception as e:
-            print(f"  Screenshot failed: {e}", file=sys.stderr)
-
-        meta = {}
-        try:
-            meta = extract_meta_from_page(url, timeout_ms=args.timeout, wait_until=args.wait_until, block_ads=args.block_ads)
-        except Exception as e:
-            print(f"  Meta extract failed: {e}", file=sys.stderr)
-
-        # Decide generator
-        tweet = ''
-        if args.use_openai:
-            try:
-                tags = [t.strip() for t in (args.hashtags or '').split(',') if t.strip()]
-                tweet = generate_tweet_openai(
-                    meta=meta,
-                    url=url,
-                    model=args.openai_model,
-                    tone=args.tone,
-                    brand=(args.brand or None),
-                    hashtags=(tags or None),
-                    cta=args.cta,
-                    hashtag_strategy=args.hashtag_strategy,
-                )
-                source = 'openai'
-            except Exception as e:
-                print(f"  OpenAI generation failed: {e}. Falling back to local generator.", file=sys.stderr)
-                tweet = compose_tweet(meta, url)
-                source = 'local'
-        else:
-            tweet = compose_tweet(meta, url)
-            source = 'local'
-
-        record = {
-            'url': url,
-            'image': shot_path,
-            'tweet': tweet,
-            'generated_by': source,
-            'meta': meta,
-        }
+        record = {'url': url}
+        failure = capture_record(
+            record,
+            args.out,
+            viewport=(args.width, args.height),
+            timeout_ms=args.timeout,
+            wait_until=args.wait_until,
+            block_ads=args.block_ads,
+        )
+        generate_record(record, **generate_kwargs)
 
         # Optional: post to X
         if args.post_to_x:
-            try:
-                alt_text = None
-                if args.x_use_alt:
-                    # derive a short alt text from meta
-                    t = meta.get('og:title') or meta.get('title') or ''
-                    d = meta.get('og:description') or meta.get('description') or ''
-                    alt_text = (t or d)[:420]
-                tweet_id = tweet_url = None
-                if shot_path and Path(shot_path).is_file():
-                    # Prefer v2 post with media; fall back to v1.1
-                    try:
-                        tweet_id, tweet_url = post_tweet_with_media_v2(tweet, Path(shot_path), alt_text=alt_text, dry_run=False)
-                    except Exception as e_v2:
-                        print(f"  v2 post failed: {e_v2}. Trying v1.1...", file=sys.stderr)
-                        tweet_id, tweet_url = post_tweet_with_media_v1(tweet, Path(shot_path), alt_text=alt_text, dry_run=False)
-                else:
-                    # Text-only fallback
-                    try:
-                        tweet_id, tweet_url = post_text_v2(tweet, dry_run=False)
-                    except Exception as e_v2:
-                        print(f"  v2 text post failed: {e_v2}. Trying v1.1...", file=sys.stderr)
-                        tweet_id, tweet_url = post_text_v1(tweet, dry_run=False)
-                record['x_tweet_id'] = tweet_id
-                record['x_url'] = tweet_url
-                if args.x_wait_seconds:
-                    time.sleep(args.x_wait_seconds)
-            except XAuthError as e:
-                print(f"  X posting skipped: {e}", file=sys.stderr)
-            except Exception as e:
-                print(f"  X posting failed: {e}", file=sys.stderr)
+            # capture can outlast the lease; if another worker reclaimed the
+            # URL meanwhile, it will post it, so we must not
+            if queue is not None and not queue.renew(url, worker, lease_seconds=args.lease_seconds):
+                print(f"  Lease lost before posting, not posting: {url}", file=sys.stderr)
+                results.append(record)
+                continue
+            failure = post_record(record, use_alt=args.x_use_alt, wait_seconds=args.x_wait_seconds) or failure
+
+        if queue is not None:
+            if failure:
+                queue.fail(url, worker, failure)
+            else:
+                queue.complete(url, worker)
 
         results.append(record)
 
-    # write outputs
-    (args.out / 'posts.json').write_text(json.dumps(results, indent=2))
-    with (args.out / 'posts.csv').open('w', newline='') as f:
-        w = csv.writer(f)
-        w.writerow(['url', 'image', 'tweet'])
-        for r in results:
-            w.writerow([r['url'], r['image'], r['tweet']])
-
-    # nice markdown for manual posting
-    lines = []
-    for r in results:
-        lines.append(f"- URL: {r['url']}")
-        lines.append(f"  Image: {r['image']}")
-        lines.append(f"  Tweet: {r['tweet']}")
-        lines.append("")
-    (args.out / 'posts.md').write_text('\n'.join(lines))
+    if queue is not None:
+        queue.close()
+    _record_run(index, state, fresh, picked)
 
+    write_outputs(results, args.out)
     print(f"Done. Wrote: {args.out/'posts.json'}, {args.out/'posts.csv'}, {args.out/'posts.md'}")
 
 
+def main(argv=None):
+    """`main <stage> ...` runs a single stage; without a stage name, the
+    whole pipeline runs in one process (the original behaviour)."""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in STAGES:
+        stage_main(argv)
+    else:
+        run_all(argv)
+
+
 if __name__ == '__main__':
     main()
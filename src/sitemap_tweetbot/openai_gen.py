@@ -1,71 +1,17 @@
 import os
 from typing import Dict, List, Optional
 
-try:
-    from openai import OpenAI
-except Exception:  # pragma: no cover
-    OpenAI = None  # type: ignore
+from .hashtags import get_index
 
 
 DEFAULT_MODEL = "gpt-4o-mini"
 
-# Curated, higher-reach but still relevant hashtag bundles
-POPULAR_TAGS = {
-    'security': ['#Cybersecurity', '#InfoSec', '#PKI', '#TLS', '#AppSec'],
-    'crypto': ['#Crypto', '#Cryptography', '#Encryption'],
-    'dev': ['#Developers', '#DevTools', '#OpenSource'],
-    'electronics': ['#Electronics', '#STEM', '#Engineering'],
-    'math': ['#Math', '#STEM', '#Education'],
-    'physics': ['#Physics', '#STEM', '#Science'],
-    'chemistry': ['#Chemistry', '#STEM', '#Science'],
-    'pdf': ['#PDF', '#Productivity', '#Docs'],
-    'video': ['#VideoEditing', '#ContentCreation', '#Video'],
-    'devops': ['#DevOps', '#Kubernetes', '#SRE'],
-    'network': ['#Networking', '#NetworkEngineering', '#SysAdmin'],
-    'encoders': ['#Encoding', '#Decoding', '#DataFormats'],
-    'finance': ['#Finance', '#FinTech', '#Investing'],
-    'health': ['#HealthTech', '#Healthcare', '#MedTech'],
-    'general': ['#Tech', '#Learn', '#Tools'],
-}
+# Curated, higher-reach but still relevant hashtag bundles (see hashtags.json)
+POPULAR_TAGS = get_index().buckets
 
 
 def _choose_buckets(title: str, keywords: str) -> List[str]:
-    text = f"{title} {keywords}".lower()
-    buckets = []
-    def add(b):
-        if b not in buckets:
-            buckets.append(b)
-    if any(k in text for k in ['ssl', 'tls', 'pki', 'certificate', 'cert', 'jwt', 'jws', 'security', 'infosec', 'cve']):
-        add('security'); add('crypto')
-    if any(k in text for k in ['crypto', 'cryptography', 'hash', 'aes', 'rsa']):
-        add('crypto')
-    if any(k in text for k in ['developer', 'tool', 'api', 'cli', 'generator', 'calculator']):
-        add('dev')
-    if any(k in text for k in ['ohm', 'resistor', 'circuit', 'voltage', 'current', 'electronics']):
-        add('electronics')
-    if any(k in text for k in ['mean', 'median', 'mode', 'probability', 'equation', 'math', 'algebra', 'calculus']):
-        add('math')
-    if any(k in text for k in ['physics', 'mechanics', 'projectile', 'kinematics', 'motion', 'energy']):
-        add('physics')
-    if any(k in text for k in ['chemistry', 'chemical', 'stoichiometry', 'periodic', 'molecule', 'reaction']):
-        add('chemistry')
-    if any(k in text for k in ['pdf', 'document', 'merge pdf', 'split pdf', 'compress pdf', 'extract pdf']):
-        add('pdf')
-    if any(k in text for k in ['video', 'ffmpeg', 'codec', 'transcode', 'edit video', 'gif']):
-        add('video')
-    if any(k in text for k in ['devops', 'docker', 'kubernetes', 'k8s', 'helm', 'ci', 'cd', 'pipeline', 'terraform']):
-        add('devops')
-    if any(k in text for k in ['network', 'ip', 'dns', 'ping', 'traceroute', 'whois', 'subnet', 'cidr']):
-        add('network')
-    if any(k in text for k in ['encode', 'decoder', 'encoding', 'base64', 'urlencode', 'hex', 'ascii', 'qrcode']):
-        add('encoders')
-    if any(k in text for k in ['finance', 'loan', 'interest', 'mortgage', 'npv', 'roi', 'stock', 'investment']):
-        add('finance')
-    if any(k in text for k in ['health', 'bmi', 'calorie', 'nutrition', 'fitness', 'heart']):
-        add('health')
-    if not buckets:
-        add('general')
-    return buckets
+    return get_index().choose_buckets(title, keywords)
 
 
 def _build_hashtags(keywords: str, explicit_tags: Optional[List[str]], title: str, strategy: str) -> List[str]:
@@ -77,15 +23,9 @@ def _build_hashtags(keywords: str, explicit_tags: Optional[List[str]], title: st
     seen = set()
 
     if strategy in ('popular', 'auto'):
-        for b in _choose_buckets(title, keywords):
-            for h in POPULAR_TAGS.get(b, []):
-                if h.lower() not in seen:
-                    seen.add(h.lower())
-                    tags.append(h)
-                if len(tags) >= 6:
-                    break
-            if len(tags) >= 6:
-                break
+        for h in get_index().popular_tags(_choose_buckets(title, keywords), limit=6):
+            seen.add(h.lower())
+            tags.append(h)
 
     if strategy == 'auto' and len(tags) < 6:
         # augment with derived from keywords
@@ -117,7 +57,10 @@ def generate_tweet_openai(
 
     Requires OPENAI_API_KEY in environment. Falls back by raising if unavailable.
     """
-    if OpenAI is None:
+    # imported here so local-only runs never load the SDK
+    try:
+        from openai import OpenAI
+    except Exception:  # pragma: no cover
         raise RuntimeError("openai package not available. Install dependencies.")
     if not os.getenv('OPENAI_API_KEY'):
         raise RuntimeError("OPENAI_API_KEY not set in environment.")
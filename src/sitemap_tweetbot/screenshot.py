@@ -1,9 +1,10 @@
-from typing import Tuple
+from typing import Dict, Tuple
 from pathlib import Path
 from urllib.parse import urlparse
 import time
 
-from playwright.sync_api import sync_playwright, TimeoutError as PwTimeout
+# Playwright and BeautifulSoup are imported inside the functions that drive
+# the browser, so importing this module stays cheap for non-capture stages.
 
 
 DEFAULT_VIEWPORT = (1200, 675)  # 16:9, good for Twitter
@@ -51,6 +52,8 @@ def take_screenshot(
 
     Robust to slow pages by falling back through lighter wait states.
     """
+    from playwright.sync_api import sync_playwright, TimeoutError as PwTimeout
+
     out_dir.mkdir(parents=True, exist_ok=True)
     fname = sanitize_filename(url) + '.png'
     out_path = out_dir / fname
@@ -110,3 +113,43 @@ def take_screenshot(
         browser.close()
 
     return out_path
+
+
+def extract_meta_from_page(url: str, timeout_ms: int = 30000, wait_until: str = 'domcontentloaded', block_ads: bool = True) -> Dict[str, str]:
+    from bs4 import BeautifulSoup
+    from playwright.sync_api import sync_playwright
+
+    meta = {}
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        context = browser.new_context(viewport={'width': DEFAULT_VIEWPORT[0], 'height': DEFAULT_VIEWPORT[1]})
+        page = context.new_page()
+        if block_ads:
+            def _route(route):
+                u = route.request.url
+                if any(pat in u for pat in AD_HOST_PATTERNS):
+                    return route.abort()
+                return route.continue_()
+            context.route("**/*", _route)
+        # more tolerant load sequence
+        try:
+            page.goto(url, wait_until=wait_until, timeout=timeout_ms)
+        except Exception:
+            try:
+                page.goto(url, wait_until='load', timeout=int(timeout_ms*1.5))
+            except Exception:
+                page.goto(url, wait_until='domcontentloaded', timeout=int(timeout_ms*2))
+        html = page.content()
+        context.close()
+        browser.close()
+    soup = BeautifulSoup(html, 'lxml')
+    def get(name, attr='name'):
+        tag = soup.find('meta', {attr: name})
+        return (tag.get('content') or '').strip() if tag and tag.has_attr('content') else ''
+    # collect several common fields
+    meta['title'] = (soup.title.string.strip() if soup.title and soup.title.string else '')
+    meta['og:title'] = get('og:title', 'property')
+    meta['description'] = get('description')
+    meta['og:description'] = get('og:description', 'property')
+    meta['keywords'] = get('keywords')
+    return meta
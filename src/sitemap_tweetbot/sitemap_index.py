@@ -0,0 +1,297 @@
+"""Compact, memory-mapped index of a parsed sitemap.
+
+The index is rebuilt only when the sitemap (or the exclude patterns) change,
+so startup cost does not grow with the sitemap. Layout (little endian):
+
+    header      MAGIC, version, sitemap size, sitemap mtime_ns,
+                sha256(sitemap), sha256(exclude patterns), entry count,
+                selectable count
+    entries     fixed-size records: url offset, url length, lastmod (epoch
+                seconds, -1 if absent), 8-byte hash of url+lastmod, flags
+    selectable  uint32 positions of the entries not excluded by the patterns
+    blob        utf-8 URLs, concatenated
+
+Opening an index only reads the header; the selectable positions are a
+view straight onto the mapped file.
+
+A separate state file holds the sorted entry hashes seen by previous runs,
+which is what `changed()` diffs against.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import xml.etree.ElementTree as ET
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+MAGIC = b'SMIX'
+VERSION = 2
+
+_HEADER = struct.Struct('<4sIQQ32s32sII')
+_ENTRY = struct.Struct('<IIq8sB3x')
+_POS = struct.Struct('<I')
+_HASH_LEN = 8
+
+FLAG_FILTERED = 1
+
+
+def read_sitemap_entries(path: Path) -> List[Tuple[str, str]]:
+    """Return (url, lastmod) pairs in document order; lastmod may be ''."""
+    root = ET.parse(str(path)).getroot()
+    entries = []
+    # namespaces optional; match on tag suffix
+    for parent in root.iter():
+        lastmod = ''
+        locs = []
+        for child in parent:
+            if child.tag.endswith('loc') and child.text:
+                locs.append(child.text.strip())
+            elif child.tag.endswith('lastmod') and child.text:
+                lastmod = child.text.strip()
+        entries.extend((u, lastmod) for u in locs)
+    return entries
+
+
+def parse_patterns(exclude_patterns: str) -> List[str]:
+    return [p.strip().lower() for p in (exclude_patterns or '').split(',') if p.strip()]
+
+
+def is_excluded(url: str, patterns: List[str]) -> bool:
+    u = url.lower()
+    return any(p in u for p in patterns)
+
+
+def entry_hash(url: str, lastmod: str) -> bytes:
+    return hashlib.blake2b(f"{url}\n{lastmod}".encode('utf-8'), digest_size=_HASH_LEN).digest()
+
+
+def _parse_lastmod(value: str) -> int:
+    if not value:
+        return -1
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return -1
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def _file_sha256(path: Path) -> bytes:
+    h = hashlib.sha256()
+    with path.open('rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.digest()
+
+
+def _patterns_sha256(patterns: List[str]) -> bytes:
+    return hashlib.sha256('\n'.join(patterns).encode('utf-8')).digest()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def build_index(sitemap: Path, index_path: Path, patterns: List[str], digest: Optional[bytes] = None) -> None:
+    st = sitemap.stat()
+    digest = digest or _file_sha256(sitemap)
+    entries = read_sitemap_entries(sitemap)
+
+    records = bytearray()
+    selectable = bytearray()
+    blob = bytearray()
+    for i, (url, lastmod) in enumerate(entries):
+        raw = url.encode('utf-8')
+        flags = FLAG_FILTERED if is_excluded(url, patterns) else 0
+        records += _ENTRY.pack(len(blob), len(raw), _parse_lastmod(lastmod), entry_hash(url, lastmod), flags)
+        if not flags & FLAG_FILTERED:
+            selectable += _POS.pack(i)
+        blob += raw
+
+    header = _HEADER.pack(
+        MAGIC, VERSION, st.st_size, st.st_mtime_ns, digest, _patterns_sha256(patterns),
+        len(entries), len(selectable) // _POS.size,
+    )
+    _write_atomic(index_path, header + bytes(records) + bytes(selectable) + bytes(blob))
+
+
+class SitemapIndex:
+    """Read-only view over an index file; nothing is decoded until asked for."""
+
+    def __init__(self, path: Path):
+        with Path(path).open('rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, self.sitemap_size, self.sitemap_mtime_ns, self.sitemap_sha256,
+             self.patterns_sha256, self.count, self.selectable_count) = _HEADER.unpack_from(self._mm, 0)
+        except struct.error:
+            self._mm.close()
+            raise ValueError(f"Not a sitemap index: {path}")
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"Not a sitemap index (or unsupported version): {path}")
+        self._entries_start = _HEADER.size
+        self._selectable_start = self._entries_start + self.count * _ENTRY.size
+        self._blob_start = self._selectable_start + self.selectable_count * _POS.size
+        self._view = memoryview(self._mm)
+        self._selectable = None
+
+    def close(self) -> None:
+        if self._selectable is not None:
+            self._selectable.release()
+            self._selectable = None
+        self._view.release()
+        self._mm.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _entry(self, i: int):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return _ENTRY.unpack_from(self._mm, self._entries_start + i * _ENTRY.size)
+
+    def _entries(self):
+        # iter_unpack over a memoryview slice: no copy of the record region
+        return _ENTRY.iter_unpack(self._view[self._entries_start:self._selectable_start])
+
+    def url(self, i: int) -> str:
+        off, length, _, _, _ = self._entry(i)
+        start = self._blob_start + off
+        return self._mm[start:start + length].decode('utf-8')
+
+    def lastmod(self, i: int) -> int:
+        return self._entry(i)[2]
+
+    def entry_digest(self, i: int) -> bytes:
+        return self._entry(i)[3]
+
+    def filtered(self, i: int) -> bool:
+        return bool(self._entry(i)[4] & FLAG_FILTERED)
+
+    def selectable(self) -> Sequence[int]:
+        """Positions of entries not excluded by the patterns, precomputed at
+        build time; a read-only sequence backed by the mapped file."""
+        if self._selectable is None:
+            raw = self._view[self._selectable_start:self._blob_start]
+            if sys.byteorder == 'little':
+                self._selectable = raw.cast('I')
+            else:  # pragma: no cover
+                self._selectable = memoryview(array('I', (p for (p,) in _POS.iter_unpack(raw))))
+        return self._selectable
+
+    def digests(self) -> Iterator[bytes]:
+        return (e[3] for e in self._entries())
+
+    def urls(self, positions: Optional[Iterable[int]] = None) -> List[str]:
+        if positions is None:
+            positions = self.selectable()
+        return [self.url(i) for i in positions]
+
+    def changed(self, state: 'RunState', positions: Optional[Iterable[int]] = None) -> List[int]:
+        """Positions whose url+lastmod hash was not seen by a previous run,
+        freshest lastmod first (entries without lastmod last, document order)."""
+        if positions is None:
+            # one pass over the records, skipping filtered ones by flag
+            fresh = [
+                (lastmod, i)
+                for i, (_, _, lastmod, digest, flags) in enumerate(self._entries())
+                if not flags & FLAG_FILTERED and digest not in state
+            ]
+        else:
+            fresh = []
+            for i in positions:
+                _, _, lastmod, digest, _ = self._entry(i)
+                if digest not in state:
+                    fresh.append((lastmod, i))
+        fresh.sort(key=lambda e: -e[0])
+        return [i for _, i in fresh]
+
+
+def open_index(sitemap: Path, index_path: Path, exclude_patterns: str = '') -> SitemapIndex:
+    """Open the index for sitemap, rebuilding it only if the sitemap or patterns changed."""
+    patterns = parse_patterns(exclude_patterns)
+    pattern_digest = _patterns_sha256(patterns)
+    st = sitemap.stat()
+    idx = None
+    if index_path.exists():
+        try:
+            idx = SitemapIndex(index_path)
+        except (ValueError, struct.error, OSError):
+            idx = None
+    if idx is not None and idx.patterns_sha256 == pattern_digest:
+        if idx.sitemap_size == st.st_size and idx.sitemap_mtime_ns == st.st_mtime_ns:
+            return idx
+        # touched but maybe not changed: compare content before rebuilding
+        digest = _file_sha256(sitemap)
+        if digest == idx.sitemap_sha256:
+            idx.close()
+            with index_path.open('r+b') as f:
+                fields = list(_HEADER.unpack(f.read(_HEADER.size)))
+                fields[2], fields[3] = st.st_size, st.st_mtime_ns
+                f.seek(0)
+                f.write(_HEADER.pack(*fields))
+            return SitemapIndex(index_path)
+    else:
+        digest = None
+    if idx is not None:
+        idx.close()
+    build_index(sitemap, index_path, patterns, digest=digest)
+    return SitemapIndex(index_path)
+
+
+class RunState:
+    """Sorted entry hashes from previous runs, memory-mapped for bisection."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._mm = None
+        self.count = 0
+        self._open()
+
+    def _open(self) -> None:
+        if self.path.exists() and self.path.stat().st_size:
+            with self.path.open('rb') as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.count = len(self._mm) // _HASH_LEN
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self.count = 0
+
+    def __contains__(self, h: bytes) -> bool:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cur = self._mm[mid * _HASH_LEN:(mid + 1) * _HASH_LEN]
+            if cur < h:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < self.count and self._mm[lo * _HASH_LEN:(lo + 1) * _HASH_LEN] == h
+
+    def save(self, hashes: Set[bytes]) -> None:
+        self.close()
+        _write_atomic(self.path, b''.join(sorted(hashes)))
+        self._open()
+
+
+def record_run(index: SitemapIndex, state: RunState, pending: Iterable[int]) -> None:
+    """Mark every current entry as seen except `pending` (changed but not
+    yet processed), so those stay selectable by the next --only-changed run.
+    Entries that left the sitemap drop out of the state."""
+    skip = set(pending)
+    state.save({h for i, h in enumerate(index.digests()) if i not in skip})
@@ -0,0 +1,290 @@
+"""Pipeline stages over a shared record format.
+
+A record is one JSON object per line (JSONL) with the fields of a posts.json
+entry: url, image, meta, tweet, generated_by, and after posting x_tweet_id /
+x_url. Each stage fills in its own fields and passes the rest through, so
+stages can run separately, on different hosts, or again over their own
+output. Heavy dependencies are imported only by the stage that needs them.
+"""
+import csv
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .screenshot import DEFAULT_VIEWPORT
+from .openai_gen import DEFAULT_MODEL as OPENAI_DEFAULT_MODEL
+from .tweetgen import compose_tweet, compose_variants
+
+
+def read_records(path: str) -> Iterator[Dict]:
+    """Yield records from a JSONL file, or stdin for '-'."""
+    f = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _dump(record: Dict) -> str:
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def write_records(records: Iterable[Dict], path: str, append: bool = False) -> int:
+    """Write records as JSONL to path (stdout for '-').
+
+    Records are written as they are produced, so an interrupted run keeps
+    what it has done. stdout is flushed per record so stages can be piped.
+    """
+    n = 0
+    if path == '-':
+        for r in records:
+            sys.stdout.write(_dump(r))
+            sys.stdout.flush()
+            n += 1
+        return n
+    out = Path(path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with out.open('a' if append else 'w', encoding='utf-8') as f:
+        for r in records:
+            f.write(_dump(r))
+            n += 1
+    return n
+
+
+def _same_file(a: str, b: str) -> bool:
+    return a != '-' and b != '-' and Path(a).resolve() == Path(b).resolve()
+
+
+def captured(record: Dict) -> bool:
+    """True once capture got the page's meta or a screenshot."""
+    return bool(record.get('meta') or record.get('image'))
+
+
+def posted(record: Dict) -> bool:
+    """True once the record's tweet is on X."""
+    return bool(record.get('x_tweet_id'))
+
+
+def _replace_records(records: Iterable[Dict], path: Path) -> None:
+    tmp = path.with_name(path.name + '.tmp')
+    write_records(records, str(tmp))
+    os.replace(tmp, path)
+
+
+def process_records(
+    in_path: str,
+    out_path: str,
+    fn: Callable[[Dict], Dict],
+    done: Optional[Callable[[Dict], bool]] = None,
+) -> int:
+    """Apply fn to every record of in_path and write the results to out_path.
+
+    With a `done` predicate (e.g. `posted`), an existing out_path is resumed:
+    records there that satisfy it are kept and their URLs skipped, the rest
+    are dropped from it and processed again, so re-running an interrupted or
+    partly failed stage retries only what is left. Rewriting a file in place
+    goes through a temp file; if the run is interrupted, the unprocessed
+    records are copied over unchanged before the swap, so no input is lost.
+    """
+    records = read_records(in_path)
+    if not _same_file(in_path, out_path):
+        skip = set()
+        append = done is not None and out_path != '-' and Path(out_path).exists()
+        if append:
+            kept = [r for r in read_records(out_path) if done(r)]
+            skip = {r.get('url') for r in kept}
+            # failed records are retried below; drop their old lines
+            _replace_records(kept, Path(out_path))
+        todo = (r for r in records if r.get('url') not in skip)
+        return write_records((fn(r) for r in todo), out_path, append=append)
+
+    out = Path(out_path)
+    tmp = out.with_name(out.name + '.tmp')
+    n = 0
+    complete = False
+    try:
+        with tmp.open('w', encoding='utf-8') as f:
+            for r in records:
+                try:
+                    result = fn(r)
+                except BaseException:
+                    # interrupted: keep this record and the rest untouched
+                    f.write(_dump(r))
+                    for rest in records:
+                        f.write(_dump(rest))
+                    complete = True
+                    raise
+                f.write(_dump(result))
+                n += 1
+            complete = True
+    finally:
+        if complete:
+            os.replace(tmp, out)
+        elif tmp.exists():
+            tmp.unlink()
+    return n
+
+
+def capture_record(
+    record: Dict,
+    out_dir: Path,
+    viewport: Tuple[int, int] = DEFAULT_VIEWPORT,
+    timeout_ms: int = 30000,
+    wait_until: str = 'domcontentloaded',
+    block_ads: bool = True,
+) -> str:
+    """Fill in record['image'] and record['meta'].
+
+    Returns a failure reason, or '' if at least one of them was captured.
+    """
+    from .screenshot import take_screenshot, extract_meta_from_page
+
+    url = record['url']
+    failure = ''
+    shot_path = ''
+    try:
+        shot = take_screenshot(
+            url,
+            out_dir,
+            viewport=viewport,
+            timeout_ms=timeout_ms,
+            wait_until=wait_until,
+            block_ads=block_ads,
+        )
+        shot_path = str(shot)
+    except Exception as e:
+        print(f"  Screenshot failed: {e}", file=sys.stderr)
+
+    meta = {}
+    try:
+        meta = extract_meta_from_page(url, timeout_ms=timeout_ms, wait_until=wait_until, block_ads=block_ads)
+    except Exception as e:
+        print(f"  Meta extract failed: {e}", file=sys.stderr)
+        if not shot_path:
+            failure = f"capture failed: {e}"
+
+    record['image'] = shot_path
+    record['meta'] = meta
+    return failure
+
+
+def generate_record(
+    record: Dict,
+    use_openai: bool = False,
+    openai_model: str = OPENAI_DEFAULT_MODEL,
+    tone: str = 'helpful, confident, concise',
+    brand: Optional[str] = None,
+    hashtags: Optional[List[str]] = None,
+    cta: str = 'Try it',
+    hashtag_strategy: str = 'auto',
+    variants: int = 1,
+) -> None:
+    """Fill in record['tweet'] and record['generated_by'] (plus
+    record['tweet_variants'] when the local generator emits several)."""
+    url = record['url']
+    meta = record.get('meta') or {}
+    record.pop('tweet_variants', None)
+    if use_openai:
+        from .openai_gen import generate_tweet_openai
+
+        try:
+            record['tweet'] = generate_tweet_openai(
+                meta=meta,
+                url=url,
+                model=openai_model,
+                tone=tone,
+                brand=brand,
+                hashtags=hashtags,
+                cta=cta,
+                hashtag_strategy=hashtag_strategy,
+            )
+            record['generated_by'] = 'openai'
+            return
+        except Exception as e:
+            print(f"  OpenAI generation failed: {e}. Falling back to local generator.", file=sys.stderr)
+            record['tweet'] = compose_tweet(meta, url)
+            record['generated_by'] = 'local'
+            return
+    tweets = compose_variants(meta, url, max(1, variants))
+    record['tweet'] = tweets[0]
+    record['generated_by'] = 'local'
+    if len(tweets) > 1:
+        record['tweet_variants'] = tweets
+
+
+def post_record(record: Dict, use_alt: bool = True, wait_seconds: int = 2, dry_run: bool = False) -> str:
+    """Post record['tweet'] to X, with record['image'] when it exists.
+
+    Sets record['x_tweet_id'] / record['x_url']; returns a failure reason or ''.
+    """
+    from .x_poster import (
+        post_tweet_with_media_v2,
+        post_tweet_with_media_v1,
+        post_text_v2,
+        post_text_v1,
+        XAuthError,
+    )
+
+    tweet = record.get('tweet') or ''
+    meta = record.get('meta') or {}
+    shot_path = record.get('image') or ''
+    try:
+        alt_text = None
+        if use_alt:
+            # derive a short alt text from meta
+            t = meta.get('og:title') or meta.get('title') or ''
+            d = meta.get('og:description') or meta.get('description') or ''
+            alt_text = (t or d)[:420]
+        tweet_id = tweet_url = None
+        if shot_path and Path(shot_path).is_file():
+            # Prefer v2 post with media; fall back to v1.1
+            try:
+                tweet_id, tweet_url = post_tweet_with_media_v2(tweet, Path(shot_path), alt_text=alt_text, dry_run=dry_run)
+            except Exception as e_v2:
+                print(f"  v2 post failed: {e_v2}. Trying v1.1...", file=sys.stderr)
+                tweet_id, tweet_url = post_tweet_with_media_v1(tweet, Path(shot_path), alt_text=alt_text, dry_run=dry_run)
+        else:
+            # Text-only fallback
+            try:
+                tweet_id, tweet_url = post_text_v2(tweet, dry_run=dry_run)
+            except Exception as e_v2:
+                print(f"  v2 text post failed: {e_v2}. Trying v1.1...", file=sys.stderr)
+                tweet_id, tweet_url = post_text_v1(tweet, dry_run=dry_run)
+        record['x_tweet_id'] = tweet_id
+        record['x_url'] = tweet_url
+        if wait_seconds and not dry_run:
+            time.sleep(wait_seconds)
+    except XAuthError as e:
+        print(f"  X posting skipped: {e}", file=sys.stderr)
+        return f"posting skipped: {e}"
+    except Exception as e:
+        print(f"  X posting failed: {e}", file=sys.stderr)
+        return f"posting failed: {e}"
+    return ''
+
+
+def write_outputs(results: List[Dict], out: Path) -> None:
+    """Write posts.json, posts.csv and posts.md for a batch of records."""
+    out.mkdir(parents=True, exist_ok=True)
+    (out / 'posts.json').write_text(json.dumps(results, indent=2))
+    with (out / 'posts.csv').open('w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(['url', 'image', 'tweet'])
+        for r in results:
+            w.writerow([r['url'], r.get('image', ''), r.get('tweet', '')])
+
+    # nice markdown for manual posting
+    lines = []
+    for r in results:
+        lines.append(f"- URL: {r['url']}")
+        lines.append(f"  Image: {r.get('image', '')}")
+        lines.append(f"  Tweet: {r.get('tweet', '')}")
+        lines.append("")
+    (out / 'posts.md').write_text('\n'.join(lines))
@@ -1,19 +1,25 @@
 import re
-from typing import List, Dict
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .hashtags import get_index, meta_text
 
 MAX_LEN = 280
 
+# X counts every link as a t.co URL of this length, whatever its real size
+URL_WEIGHT = 23
+
 _EMOJI = "⚡️"
 
-COMMON_HASHTAGS = {
-    'crypto': '#crypto', 'cryptography': '#cryptography', 'security': '#security', 'privacy': '#privacy',
-    'ssl': '#ssl', 'tls': '#tls', 'certificate': '#PKI', 'pki': '#PKI', 'ssl/tls': '#TLS',
-    'electronics': '#electronics', 'circuits': '#circuits', 'ee': '#EE', 'stem': '#STEM',
-    'makers': '#makers', 'developer': '#devtools', 'tools': '#tools', 'calculator': '#calculator',
-}
+# keyword -> hashtag overrides, shared with the bucket index (see hashtags.json)
+COMMON_HASHTAGS = get_index().common
 
 STOPWORDS = set('a an and the for to of with in on at from by your our you we us is are this that it as be or if into about using make get free new'.split())
 
+_KEYWORD_SPLIT_RE = re.compile(r'[\s/,-]+')
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]+')
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
 
 def _slugify(text: str) -> str:
     text = re.sub(r'[^a-zA-Z0-9\s-]', '', text).strip().lower()
@@ -26,18 +32,18 @@ def derive_hashtags(meta_keywords: List[str], title: str) -> List[str]:
     seen = set()
     # from meta keywords first
     for kw in meta_keywords:
-        for token in re.split(r'[\s/,-]+', kw.lower()):
+        for token in _KEYWORD_SPLIT_RE.split(kw.lower()):
             token = token.strip()
             if not token or token in STOPWORDS:
                 continue
-            tag = COMMON_HASHTAGS.get(token) or f"#{re.sub(r'[^a-z0-9]+','', token)}"
+            tag = COMMON_HASHTAGS.get(token) or '#' + _NON_ALNUM_RE.sub('', token)
             if len(tag) > 1 and tag not in seen:
                 seen.add(tag)
                 tags.append(tag)
             if len(tags) >= 3:
                 return tags
     # fallback to title words
-    for token in re.findall(r"[A-Za-z0-9]+", title.lower()):
+    for token in _WORD_RE.findall(title.lower()):
         if token in STOPWORDS or len(token) < 3:
             continue
         tag = COMMON_HASHTAGS.get(token) or f"#{token}"
@@ -49,40 +55,270 @@ def derive_hashtags(meta_keywords: List[str], title: str) -> List[str]:
     return tags[:3]
 
 
-def compose_tweet(meta: Dict[str, str], url: str) -> str:
-    title = meta.get('og:title') or meta.get('title') or 'Check this out'
-    desc = meta.get('og:description') or meta.get('description') or ''
-    keywords = [k.strip() for k in (meta.get('keywords') or '').split(',') if k.strip()]
+# Weighted length, per X's twitter-text v3 config: code points in these
+# ranges count 1, everything else (CJK, most symbols) counts 2, and an
+# emoji sequence counts 2 however many code points it spans.
+_LIGHT_RANGES = ((0, 4351), (8192, 8205), (8208, 8223), (8242, 8247))
+
+# Only explicit http(s) links are counted as URLs. X also links bare
+# domains on any valid TLD (twitter-text ships the full list); we do not
+# carry that list, so keep bare domains out of composed text, or a short
+# 'foo.xyz' counted at its real length may weigh 23 on X.
+_URL_RE = re.compile(r'https?://\S+', re.IGNORECASE)
+
+_NON_ASCII_RE = re.compile(r'[^\x00-\x7f]+')
+
+_ZWJ = 0x200D
+
+_ELLIPSIS = '\u2026'
+
+_TOOL_WORDS = ('calculator', 'tool', 'generator')
+
+# (include description, max hashtags, alternate CTA, URL last)
+VARIANT_STYLES = (
+    (True, 3, False, False),
+    (False, 3, False, False),
+    (True, 2, True, True),
+)
+
+
+def _is_emoji_component(cp: int) -> bool:
+    # variation selectors, ZWJ, keycap, skin tones, tag characters
+    return (
+        cp in (0xFE0E, 0xFE0F, _ZWJ, 0x20E3)
+        or 0x1F3FB <= cp <= 0x1F3FF
+        or 0xE0020 <= cp <= 0xE007F
+    )
+
+
+def _char_weight(cp: int) -> int:
+    for lo, hi in _LIGHT_RANGES:
+        if lo <= cp <= hi:
+            return 1
+    return 2
+
+
+def _run_weight(run: str, prev_w: int) -> int:
+    n = 0
+    join_next = False
+    regional_open = False
+    for ch in run:
+        cp = ord(ch)
+        if _is_emoji_component(cp):
+            if prev_w == 1:
+                # e.g. keycap '1\ufe0f\u20e3' or '\u00a9\ufe0f': the base becomes an emoji
+                n += 1
+                prev_w = 2
+            join_next = cp == _ZWJ
+            continue
+        if join_next:
+            # ZWJ sequence collapses into the preceding emoji
+            join_next = False
+            continue
+        if 0x1F1E6 <= cp <= 0x1F1FF:
+            # flags are pairs of regional indicators
+            if regional_open:
+                regional_open = False
+                continue
+            regional_open = True
+        else:
+            regional_open = False
+        prev_w = _char_weight(cp)
+        n += prev_w
+    return n
+
+
+def _plain_weight(text: str) -> int:
+    if text.isascii():
+        return len(text)
+    # ASCII counts 1 per char; only walk the non-ASCII runs
+    n = len(text)
+    for m in _NON_ASCII_RE.finditer(text):
+        run = m.group()
+        n += _run_weight(run, 1 if m.start() else 0) - len(run)
+    return n
+
+
+def weighted_length(text: str) -> int:
+    """Length of text as X counts it against the 280 limit."""
+    text = unicodedata.normalize('NFC', text)
+    n = 0
+    pos = 0
+    for m in _URL_RE.finditer(text):
+        n += _plain_weight(text[pos:m.start()]) + URL_WEIGHT
+        pos = m.end()
+    return n + _plain_weight(text[pos:])
+
+
+def _clusters(text: str) -> List[str]:
+    """Split text into code points, keeping emoji sequences (modifiers,
+    ZWJ joins, flag pairs) whole so a cut never lands inside one."""
+    out: List[str] = []
+    join_next = False
+    for ch in text:
+        cp = ord(ch)
+        regional = 0x1F1E6 <= cp <= 0x1F1FF
+        if out and (
+            join_next
+            or _is_emoji_component(cp)
+            or (regional and len(out[-1]) == 1 and 0x1F1E6 <= ord(out[-1]) <= 0x1F1FF)
+        ):
+            out[-1] += ch
+        else:
+            out.append(ch)
+        join_next = cp == _ZWJ
+    return out
+
+
+def _fit_words(text: str, budget: int) -> str:
+    """Longest prefix of text that fits budget, with an ellipsis if cut.
+
+    Cuts at a word boundary, unless that would use less than half the
+    budget (CJK and other unspaced text): then the cut falls between code
+    points inside the next word.
+    """
+    if weighted_length(text) <= budget:
+        return text
+    budget -= weighted_length(_ELLIPSIS)  # U+2026 is outside the light ranges: counts 2
+    words = text.split()
+    used = 0
+    keep = 0
+    for i, w in enumerate(words):
+        cost = weighted_length(w) + (1 if i else 0)
+        if used + cost > budget:
+            break
+        used += cost
+        keep = i + 1
+    head = ' '.join(words[:keep])
+    if keep < len(words) and used < budget // 2:
+        part = ''
+        room = budget - used - (1 if keep else 0)
+        for c in _clusters(words[keep]):
+            w = _plain_weight(c)
+            if w > room:
+                break
+            part += c
+            room -= w
+        if part:
+            head = f"{head} {part}" if head else part
+    head = head.rstrip('.,;:!?-\u3001\u3002\uff0c')
+    return head + _ELLIPSIS if head else ''
+
+
+def _ctas(title: str):
+    if any(x in title.lower() for x in _TOOL_WORDS):
+        return 'Try it', 'Try it free'
+    return 'Learn more', 'Read more'
 
-    hashtags = derive_hashtags(keywords, title)
-    cta = 'Try it' if any(x in title.lower() for x in ['calculator', 'tool', 'generator']) else 'Learn more'
 
-    base = f"{_EMOJI} {title}."
+def _pack(title: str, desc: str, url: str, hashtags: List[str], cta: str, url_last: bool) -> str:
+    """Fit the parts into MAX_LEN weighted chars.
+
+    The URL and CTA are always kept. Space is given up in order: the
+    description (word by word), hashtags (from the end), then the title.
+    """
+    def render(t: str, d: str, tags: List[str]) -> str:
+        head = f"{_EMOJI} {t}" if t else _EMOJI
+        if t and not t.endswith(('.', '!', '?', _ELLIPSIS)):
+            head += '.'
+        if d:
+            head += f" {d}"
+        tail = [' '.join(tags), cta]
+        parts = [head] + (tail + [url] if url_last else [url] + tail)
+        return ' '.join(p for p in parts if p)
+
+    tweet = render(title, desc, hashtags)
+    if weighted_length(tweet) <= MAX_LEN:
+        return tweet
+
     if desc:
-        base += f" {desc}"
-
-    parts = [base.strip()]
-    if url:
-        parts.append(url)
-    if hashtags:
-        parts.append(' '.join(hashtags[:3]))
-    parts.append(cta)
-
-    tweet = ' '.join(p for p in parts if p)
-
-    # Trim to 280 chars without cutting URL
-    if len(tweet) > MAX_LEN and url in tweet:
-        # reserve url length + space
-        reserve = len(url) + 1
-        before_url, after_url = tweet.split(url, 1)
-        head = before_url.strip()
-        tail = after_url.strip()
-        # trim head first
-        head = head[: MAX_LEN - reserve - len(tail) - 1].rstrip()
-        tweet = f"{head} {url} {tail}".strip()
-
-    if len(tweet) > MAX_LEN:
-        tweet = tweet[:MAX_LEN].rstrip()
+        room = MAX_LEN - weighted_length(render(title, '', hashtags)) - 1
+        desc = _fit_words(desc, room) if room > 1 else ''
+        tweet = render(title, desc, hashtags)
+        if weighted_length(tweet) <= MAX_LEN:
+            return tweet
+
+    tags = list(hashtags)
+    while tags and weighted_length(tweet) > MAX_LEN:
+        tags.pop()
+        tweet = render(title, '', tags)
 
+    if weighted_length(tweet) > MAX_LEN:
+        room = MAX_LEN - weighted_length(render('', '', tags)) - 2
+        tweet = render(_fit_words(title, room) if room > 1 else '', '', tags)
+    # with the title fitted to the remaining room this always fits: the
+    # emoji, URL (23) and CTA alone are far below MAX_LEN
     return tweet
 
+
+def select_hashtags(meta: Dict[str, str], ranked: Optional[List[Tuple[str, float]]] = None, limit: int = 3) -> List[str]:
+    """Tags from the shared ranked index first, topped up with tags derived
+    from the page's own keywords/title.
+
+    Only ranked tags with a real match (score > 0) are used, so a page that
+    falls into the generic bucket keeps its specific derived tags.
+    """
+    if ranked is None:
+        ranked = get_index().rank_hashtags(*meta_text(meta), limit=limit)
+    title = meta.get('og:title') or meta.get('title') or 'Check this out'
+    keywords = [k.strip() for k in (meta.get('keywords') or '').split(',') if k.strip()]
+
+    tags: List[str] = []
+    seen = set()
+    for tag in [t for t, score in ranked if score > 0] + derive_hashtags(keywords, title):
+        if tag.lower() not in seen:
+            seen.add(tag.lower())
+            tags.append(tag)
+        if len(tags) >= limit:
+            break
+    return tags
+
+
+def compose_variants(
+    meta: Dict[str, str],
+    url: str,
+    variants: int = 1,
+    ranked: Optional[List[Tuple[str, float]]] = None,
+) -> List[str]:
+    """Compose up to len(VARIANT_STYLES) distinct tweets for one page, for A/B testing.
+
+    `ranked` takes precomputed HashtagIndex.rank_hashtags output (batch callers).
+    """
+    title = meta.get('og:title') or meta.get('title') or 'Check this out'
+    desc = meta.get('og:description') or meta.get('description') or ''
+
+    hashtags = select_hashtags(meta, ranked)
+    cta, alt_cta = _ctas(title)
+
+    out: List[str] = []
+    for with_desc, n_tags, use_alt_cta, url_last in VARIANT_STYLES:
+        if len(out) >= variants:
+            break
+        tweet = _pack(
+            title.strip(),
+            desc.strip() if with_desc else '',
+            url,
+            hashtags[:n_tags],
+            alt_cta if use_alt_cta else cta,
+            url_last,
+        )
+        if tweet not in out:
+            out.append(tweet)
+    return out
+
+
+def compose_tweet(meta: Dict[str, str], url: str) -> str:
+    return compose_variants(meta, url, 1)[0]
+
+
+def compose_tweets(records: Iterable[Dict], variants: int = 1) -> List[List[str]]:
+    """Batch-compose tweets for records shaped like posts.json entries ({'url', 'meta'}).
+
+    Returns one list of variants per record, in input order.
+    """
+    records = list(records)
+    ranked = get_index().rank_hashtags_many((r.get('meta') or {} for r in records), limit=3)
+    return [
+        compose_variants(r.get('meta') or {}, r.get('url') or '', variants, ranked=rk)
+        for r, rk in zip(records, ranked)
+    ]
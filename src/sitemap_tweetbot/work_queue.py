@@ -0,0 +1,255 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_MAX_ATTEMPTS = 3
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue(ABC):
+    """URLs claimed by workers under time-limited leases.
+
+    A claimed URL belongs to one worker until it is completed, failed, or
+    its lease expires; expired leases go back to pending and are handed out
+    again by the next claim. Enqueueing is idempotent, so every node can
+    enqueue the same sitemap without creating duplicates.
+    """
+
+    @abstractmethod
+    def enqueue(self, urls: Iterable[str], requeue: bool = False) -> int:
+        """Add URLs not already queued; returns how many were added.
+
+        With requeue, URLs already done or failed go back to pending with a
+        fresh attempt count (a page that changed since it was processed);
+        these count as added. Pending and leased URLs are left alone.
+        """
+
+    @abstractmethod
+    def claim(self, worker: str, n: int, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> List[str]:
+        """Lease up to n pending URLs to worker."""
+
+    @abstractmethod
+    def renew(self, url: str, worker: str, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+        """Extend a lease; False if the worker no longer holds it."""
+
+    @abstractmethod
+    def complete(self, url: str, worker: str) -> bool:
+        """Mark a held URL done."""
+
+    @abstractmethod
+    def fail(self, url: str, worker: str, error: str = '') -> bool:
+        """Give a URL back; it is retried until max_attempts claims, then parked as failed."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Count of URLs per status."""
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """Queue backed by a SQLite file that all workers can open.
+
+    Claims run in a write transaction (BEGIN IMMEDIATE), so two workers never
+    receive the same URL. Uses the default rollback journal rather than WAL
+    because WAL does not work on network filesystems.
+    """
+
+    def __init__(self, path: Path, max_attempts: int = DEFAULT_MAX_ATTEMPTS, timeout: float = 30.0):
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), timeout=timeout, isolation_level=None)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS queue (
+                url TEXT PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated REAL,
+                error TEXT
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS queue_status ON queue (status, lease_until)")
+
+    def _tx(self):
+        self._db.execute('BEGIN IMMEDIATE')
+
+    def enqueue(self, urls: Iterable[str], requeue: bool = False) -> int:
+        now = time.time()
+        if requeue:
+            sql = (
+                "INSERT INTO queue (url, status, updated) VALUES (?, 'pending', ?) "
+                "ON CONFLICT(url) DO UPDATE SET status = 'pending', attempts = 0, worker = NULL, "
+                "lease_until = NULL, error = NULL, updated = excluded.updated "
+                "WHERE status IN ('done', 'failed')"
+            )
+        else:
+            sql = "INSERT OR IGNORE INTO queue (url, status, updated) VALUES (?, 'pending', ?)"
+        self._tx()
+        try:
+            before = self._db.total_changes
+            self._db.executemany(sql, ((u, now) for u in urls))
+            added = self._db.total_changes - before
+            self._db.execute('COMMIT')
+        except Exception:
+            self._db.execute('ROLLBACK')
+            raise
+        return added
+
+    def claim(self, worker: str, n: int, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> List[str]:
+        if n <= 0:
+            return []
+        now = time.time()
+        self._tx()
+        try:
+            # reclaim expired leases
+            self._db.execute(
+                "UPDATE queue SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "worker = NULL, lease_until = NULL, updated = ?, error = 'lease expired' "
+                "WHERE status = 'leased' AND lease_until < ?",
+                (self.max_attempts, now, now),
+            )
+            urls = [r[0] for r in self._db.execute(
+                "SELECT url FROM queue WHERE status = 'pending' ORDER BY rowid LIMIT ?", (n,)
+            )]
+            self._db.executemany(
+                "UPDATE queue SET status = 'leased', worker = ?, lease_until = ?, "
+                "attempts = attempts + 1, updated = ? WHERE url = ?",
+                ((worker, now + lease_seconds, now, u) for u in urls),
+            )
+            self._db.execute('COMMIT')
+        except Exception:
+            self._db.execute('ROLLBACK')
+            raise
+        return urls
+
+    def _update_held(self, sql: str, params: tuple) -> bool:
+        cur = self._db.execute(sql + " WHERE url = ? AND worker = ? AND status = 'leased'", params)
+        return cur.rowcount == 1
+
+    def renew(self, url: str, worker: str, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+        now = time.time()
+        return self._update_held(
+            "UPDATE queue SET lease_until = ?, updated = ?", (now + lease_seconds, now, url, worker)
+        )
+
+    def complete(self, url: str, worker: str) -> bool:
+        return self._update_held(
+            "UPDATE queue SET status = 'done', lease_until = NULL, updated = ?, error = NULL",
+            (time.time(), url, worker),
+        )
+
+    def fail(self, url: str, worker: str, error: str = '') -> bool:
+        return self._update_held(
+            "UPDATE queue SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "worker = NULL, lease_until = NULL, updated = ?, error = ?",
+            (self.max_attempts, time.time(), error[:500], url, worker),
+        )
+
+    def stats(self) -> Dict[str, int]:
+        out = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        for status, count in self._db.execute("SELECT status, COUNT(*) FROM queue GROUP BY status"):
+            out[status] = count
+        return out
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class MemoryWorkQueue(WorkQueue):
+    """In-process queue with the same lease semantics, for library use by
+    several threads in one long-lived process. Not exposed on the CLI: a
+    one-shot run would discard it at exit."""
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self._items: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, urls: Iterable[str], requeue: bool = False) -> int:
+        added = 0
+        with self._lock:
+            for u in urls:
+                item = self._items.get(u)
+                if item is None or (requeue and item['status'] in (DONE, FAILED)):
+                    self._items[u] = {'status': PENDING, 'worker': None, 'lease_until': None, 'attempts': 0, 'error': None}
+                    added += 1
+        return added
+
+    def _release(self, item: dict, error: Optional[str]) -> None:
+        item['status'] = FAILED if item['attempts'] >= self.max_attempts else PENDING
+        item['worker'] = None
+        item['lease_until'] = None
+        item['error'] = error
+
+    def claim(self, worker: str, n: int, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> List[str]:
+        now = time.time()
+        urls = []
+        with self._lock:
+            for item in self._items.values():
+                if item['status'] == LEASED and item['lease_until'] < now:
+                    self._release(item, 'lease expired')
+            for u, item in self._items.items():
+                if len(urls) >= n:
+                    break
+                if item['status'] == PENDING:
+                    item.update(status=LEASED, worker=worker, lease_until=now + lease_seconds)
+                    item['attempts'] += 1
+                    urls.append(u)
+        return urls
+
+    def _held(self, url: str, worker: str) -> Optional[dict]:
+        item = self._items.get(url)
+        if item and item['status'] == LEASED and item['worker'] == worker:
+            return item
+        return None
+
+    def renew(self, url: str, worker: str, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+        with self._lock:
+            item = self._held(url, worker)
+            if item:
+                item['lease_until'] = time.time() + lease_seconds
+            return item is not None
+
+    def complete(self, url: str, worker: str) -> bool:
+        with self._lock:
+            item = self._held(url, worker)
+            if item:
+                item.update(status=DONE, lease_until=None, error=None)
+            return item is not None
+
+    def fail(self, url: str, worker: str, error: str = '') -> bool:
+        with self._lock:
+            item = self._held(url, worker)
+            if item:
+                self._release(item, error[:500])
+            return item is not None
+
+    def stats(self) -> Dict[str, int]:
+        out = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        with self._lock:
+            for item in self._items.values():
+                out[item['status']] += 1
+        return out
+
+
+def open_queue(path: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> WorkQueue:
+    """Open the shared queue at path (put it on storage every worker can reach)."""
+    return SQLiteWorkQueue(Path(path), max_attempts=max_attempts)
@@ -1,9 +1,10 @@
 import os
 import time
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import TYPE_CHECKING, Optional, Tuple
 
-import tweepy
+if TYPE_CHECKING:  # tweepy is imported lazily by the client factories
+    import tweepy
 
 
 class XAuthError(Exception):
@@ -17,8 +18,10 @@ def _get_env(name: str) -> str:
     return v
 
 
-def get_twitter_api() -> tweepy.API:
+def get_twitter_api() -> 'tweepy.API':
     """Create a Tweepy API client for v1.1 endpoints (media + status)."""
+    import tweepy
+
     api_key = _get_env('TWITTER_API_KEY')
     api_secret = _get_env('TWITTER_API_SECRET')
     access_token = _get_env('TWITTER_ACCESS_TOKEN')
@@ -34,8 +37,10 @@ def get_twitter_api() -> tweepy.API:
     return api
 
 
-def get_twitter_client() -> tweepy.Client:
+def get_twitter_client() -> 'tweepy.Client':
     """Create a Tweepy v2 Client in user context for creating tweets."""
+    import tweepy
+
     bearer = _get_env('TWITTER_BEARER_TOKEN')
     api_key = _get_env('TWITTER_API_KEY')
     api_secret = _get_env('TWITTER_API_SECRET')
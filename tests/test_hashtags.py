@@ -0,0 +1,28 @@
+from src.sitemap_tweetbot.hashtags import get_index
+
+
+def scores(title, keywords=''):
+    return dict(get_index().classify(title, keywords))
+
+
+def test_keywords_match_whole_words_only():
+    # 'ci' inside 'circuit', 'ip' inside 'tip' are not hits
+    assert 'devops' not in scores('Circuit Simulator', 'tips')
+    assert 'network' not in scores('Circuit Simulator', 'tips')
+    assert scores('IP Subnet Calculator')['network'] == 4.0
+    assert 'devops' in scores('CI pipeline')
+
+
+def test_plurals_and_phrases_fold_onto_keywords():
+    assert 'dev' in scores('Developer tools')
+    assert 'electronics' in scores('Circuits')
+    assert scores('', 'merge pdf')['pdf'] == 2.0
+
+
+def test_title_hits_outrank_keyword_hits():
+    index = get_index()
+    assert index.choose_buckets('RSA Encryption', 'ohm, resistor')[0] == 'crypto'
+    ranked = index.rank_hashtags('Ohm Law Calculator', 'resistor, voltage')
+    assert ranked[0][0] == '#Electronics'
+    assert [score for _, score in ranked] == sorted((score for _, score in ranked), reverse=True)
+    assert index.classify('', '') == [(index.fallback, 0.0)]
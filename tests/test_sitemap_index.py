@@ -0,0 +1,98 @@
+import os
+
+from src.sitemap_tweetbot import sitemap_index
+from src.sitemap_tweetbot.sitemap_index import RunState, open_index, record_run
+
+
+def write_sitemap(path, entries):
+    urls = ''.join(f'<url><loc>{u}</loc><lastmod>{lm}</lastmod></url>' for u, lm in entries)
+    path.write_text(f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>')
+
+
+ENTRIES = [
+    ('https://a.com/one', '2024-01-01'),
+    ('https://a.com/docs/two', '2024-01-02'),
+    ('https://a.com/three', '2024-01-03'),
+]
+
+
+def count_builds(monkeypatch):
+    calls = []
+    build = sitemap_index.build_index
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return build(*args, **kwargs)
+
+    monkeypatch.setattr(sitemap_index, 'build_index', counting)
+    return calls
+
+
+def test_index_is_reused_until_the_sitemap_changes(tmp_path, monkeypatch):
+    sitemap, idx_path = tmp_path / 'sitemap.xml', tmp_path / 'sitemap.idx'
+    write_sitemap(sitemap, ENTRIES)
+    builds = count_builds(monkeypatch)
+
+    index = open_index(sitemap, idx_path, '/docs/')
+    assert index.urls() == ['https://a.com/one', 'https://a.com/three']
+    index.close()
+    assert len(builds) == 1
+
+    # untouched, then touched without a content change: no rebuild
+    open_index(sitemap, idx_path, '/docs/').close()
+    st = sitemap.stat()
+    os.utime(sitemap, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    open_index(sitemap, idx_path, '/docs/').close()
+    assert len(builds) == 1
+
+    write_sitemap(sitemap, ENTRIES + [('https://a.com/four', '2024-01-04')])
+    index = open_index(sitemap, idx_path, '/docs/')
+    assert len(builds) == 2
+    assert index.urls()[-1] == 'https://a.com/four'
+    index.close()
+
+    # new exclude patterns rebuild too
+    index = open_index(sitemap, idx_path, '')
+    assert len(builds) == 3
+    assert len(index.selectable()) == 4
+    index.close()
+
+
+def test_changed_reports_added_and_modified_urls(tmp_path):
+    sitemap, idx_path = tmp_path / 'sitemap.xml', tmp_path / 'sitemap.idx'
+    write_sitemap(sitemap, ENTRIES)
+    index = open_index(sitemap, idx_path, '/docs/')
+    state = RunState(tmp_path / 'sitemap.state')
+    record_run(index, state, pending=[])
+    assert index.changed(state) == []
+    index.close()
+
+    write_sitemap(sitemap, [
+        ('https://a.com/one', '2024-02-01'),
+        ('https://a.com/docs/two', '2024-02-02'),
+        ('https://a.com/three', '2024-01-03'),
+        ('https://a.com/four', '2024-01-04'),
+    ])
+    index = open_index(sitemap, idx_path, '/docs/')
+    state = RunState(tmp_path / 'sitemap.state')
+    # freshest first; the excluded /docs/ URL is never reported
+    assert index.urls(index.changed(state)) == ['https://a.com/one', 'https://a.com/four']
+    index.close()
+    state.close()
+
+
+def test_record_run_keeps_pending_urls_pending(tmp_path):
+    sitemap, idx_path = tmp_path / 'sitemap.xml', tmp_path / 'sitemap.idx'
+    write_sitemap(sitemap, ENTRIES)
+    index = open_index(sitemap, idx_path, '')
+    state = RunState(tmp_path / 'sitemap.state')
+    assert index.changed(state) == [2, 1, 0]
+
+    record_run(index, state, pending=[1])
+    assert index.changed(state) == [1]
+    assert index.changed(RunState(tmp_path / 'sitemap.state')) == [1]
+
+    record_run(index, state, pending=[])
+    assert index.changed(state) == []
+    index.close()
+    state.close()
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from src.sitemap_tweetbot.stages import posted, process_records, read_records
+
+
+def write_jsonl(path, records):
+    path.write_text(''.join(json.dumps(r) + '\n' for r in records))
+
+
+RECORDS = [{'url': f'https://a.com/p{i}', 'tweet': 't'} for i in range(4)]
+
+
+def test_interrupted_in_place_rewrite_keeps_the_rest(tmp_path):
+    path = tmp_path / 'records.jsonl'
+    write_jsonl(path, RECORDS)
+
+    def fn(record):
+        if record['url'].endswith('p2'):
+            raise KeyboardInterrupt
+        record['x_tweet_id'] = '1'
+        return record
+
+    with pytest.raises(KeyboardInterrupt):
+        process_records(str(path), str(path), fn)
+    out = list(read_records(str(path)))
+    assert [r['url'] for r in out] == [r['url'] for r in RECORDS]
+    assert [posted(r) for r in out] == [True, True, False, False]
+    assert not (tmp_path / 'records.jsonl.tmp').exists()
+
+
+def test_resume_skips_done_and_replaces_failed_records(tmp_path):
+    src, dst = tmp_path / 'in.jsonl', tmp_path / 'out.jsonl'
+    write_jsonl(src, RECORDS)
+    # an earlier run posted p0, failed on p1 and stopped before p2/p3
+    write_jsonl(dst, [dict(RECORDS[0], x_tweet_id='1'), RECORDS[1]])
+    seen = []
+
+    def fn(record):
+        seen.append(record['url'])
+        record['x_tweet_id'] = '2'
+        return record
+
+    assert process_records(str(src), str(dst), fn, done=posted) == 3
+    assert seen == [r['url'] for r in RECORDS[1:]]
+    out = list(read_records(str(dst)))
+    assert sorted(r['url'] for r in out) == [r['url'] for r in RECORDS]
+    assert all(posted(r) for r in out)
@@ -0,0 +1,50 @@
+from src.sitemap_tweetbot.tweetgen import (
+    MAX_LEN,
+    URL_WEIGHT,
+    compose_tweet,
+    compose_variants,
+    weighted_length,
+)
+
+URL = 'https://8gwifi.org/ssl.jsp'
+
+LONG_META = {
+    'title': 'Free Online SSL Certificate Decoder',
+    'description': ' '.join(['Decode and inspect PEM certificates, chains and CSRs in your browser.'] * 6),
+    'keywords': 'ssl, tls, certificate',
+}
+
+
+def test_weighted_length_rules():
+    assert weighted_length('hello') == 5
+    assert weighted_length(URL) == URL_WEIGHT
+    assert weighted_length('…') == 2
+    assert weighted_length('日本') == 4
+    assert weighted_length('⚡️') == 2
+
+
+def test_long_description_is_trimmed_not_dropped():
+    tweet = compose_tweet(LONG_META, URL)
+    assert MAX_LEN - 5 <= weighted_length(tweet) <= MAX_LEN
+    assert 'Decode and inspect' in tweet
+    assert '…' in tweet
+    assert tweet.count('#') == 3
+    assert URL in tweet
+
+
+def test_unspaced_text_is_cut_not_dropped():
+    tweet = compose_tweet({'title': '日本語' * 100}, URL)
+    assert MAX_LEN - 5 <= weighted_length(tweet) <= MAX_LEN
+    assert '日本語日本' in tweet and '…' in tweet
+    tweet = compose_tweet({'title': 'SSL', 'description': '証明書' * 100}, URL)
+    assert MAX_LEN - 5 <= weighted_length(tweet) <= MAX_LEN
+    assert '証明書証明' in tweet
+    assert URL in tweet
+
+
+def test_every_variant_fits_and_keeps_url():
+    long_title = dict(LONG_META, title=' '.join(['Certificate'] * 40))
+    for meta in (LONG_META, long_title):
+        for tweet in compose_variants(meta, URL, 3):
+            assert weighted_length(tweet) <= MAX_LEN
+            assert URL in tweet
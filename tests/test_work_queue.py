@@ -0,0 +1,62 @@
+import threading
+
+from src.sitemap_tweetbot.work_queue import SQLiteWorkQueue
+
+URLS = [f'https://a.com/p{i}' for i in range(50)]
+
+
+def test_workers_never_claim_the_same_url(tmp_path):
+    path = tmp_path / 'queue.db'
+    SQLiteWorkQueue(path).enqueue(URLS)
+    claimed = {}
+
+    def worker(name):
+        q = SQLiteWorkQueue(path)
+        got = claimed.setdefault(name, [])
+        while True:
+            urls = q.claim(name, 3)
+            if not urls:
+                break
+            got.extend(urls)
+        q.close()
+
+    threads = [threading.Thread(target=worker, args=(f'w{i}',)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    everything = [u for urls in claimed.values() for u in urls]
+    assert sorted(everything) == sorted(URLS)
+
+
+def test_expired_lease_is_reclaimed_and_old_holder_loses_it(tmp_path):
+    q = SQLiteWorkQueue(tmp_path / 'queue.db')
+    q.enqueue(URLS[:1])
+    assert q.claim('a', 1, lease_seconds=-1) == URLS[:1]
+    assert q.claim('b', 1) == URLS[:1]
+    assert not q.renew(URLS[0], 'a')
+    assert not q.complete(URLS[0], 'a')
+    assert q.renew(URLS[0], 'b')
+    assert q.complete(URLS[0], 'b')
+    assert q.stats()['done'] == 1
+
+
+def test_max_attempts_parks_a_url_as_failed(tmp_path):
+    q = SQLiteWorkQueue(tmp_path / 'queue.db', max_attempts=2)
+    q.enqueue(URLS[:1])
+    for _ in range(2):
+        assert q.claim('a', 1) == URLS[:1]
+        assert q.fail(URLS[0], 'a', 'boom')
+    assert q.claim('a', 1) == []
+    assert q.stats()['failed'] == 1
+
+
+def test_requeue_sends_done_urls_back_to_pending(tmp_path):
+    q = SQLiteWorkQueue(tmp_path / 'queue.db')
+    assert q.enqueue(URLS[:2]) == 2
+    for u in q.claim('a', 2):
+        q.complete(u, 'a')
+    assert q.enqueue(URLS[:2]) == 0
+    assert q.enqueue(URLS[:1], requeue=True) == 1
+    assert q.stats() == {'pending': 1, 'leased': 0, 'done': 1, 'failed': 0}
+    assert q.claim('a', 2) == URLS[:1]